@@ -2,17 +2,20 @@
 Simple example demonstrating how to use the RAG system.
 """
 
-from src.rag_system import RAGSystem
+import logging
+
+from src.rag_system import RAGSystem, format_result
 
 
 def main():
     """Run a simple example of the RAG system."""
+    logging.basicConfig(level=logging.WARNING, format="%(message)s")
     
     print("Initializing RAG System...")
     print("-" * 60)
     
     # Create a RAG system instance
-    rag = RAGSystem(data_dir="data", persist_directory="chroma_db")
+    rag = RAGSystem(data_dir="data", persist_directory="faiss_index")
     
     # Initialize the system (this will load documents and create the vector store)
     rag.initialize()
@@ -22,17 +25,18 @@ def main():
     print("EXAMPLE QUESTIONS")
     print("=" * 60)
     
-    # Question 1: About RAG
-    print("\n1. Asking about RAG concept:")
-    rag.ask("What is RAG and what are its main components?")
+    examples = [
+        ("Asking about RAG concept", "What is RAG and what are its main components?"),
+        ("Asking about LangChain", "What is LangChain Expression Language (LCEL)?"),
+        ("Asking about Python best practices", "What are some Python security best practices?"),
+    ]
     
-    # Question 2: About LangChain
-    print("\n2. Asking about LangChain:")
-    rag.ask("What is LangChain Expression Language (LCEL)?")
+    # Ask all questions concurrently; results come back in the same order
+    results = rag.ask_many([question for _, question in examples])
     
-    # Question 3: About Python
-    print("\n3. Asking about Python best practices:")
-    rag.ask("What are some Python security best practices?")
+    for i, ((label, _), result) in enumerate(zip(examples, results), 1):
+        print(f"\n{i}. {label}:")
+        print(format_result(result))
     
     print("\n" + "=" * 60)
     print("Example completed!")
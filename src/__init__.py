@@ -4,7 +4,7 @@ RAG Project - Retrieval-Augmented Generation System
 A comprehensive implementation of a RAG system using LangChain and OpenAI.
 """
 
-from .rag_system import RAGSystem
+from .rag_system import RAGSystem, format_result
 
 __version__ = "1.0.0"
-__all__ = ["RAGSystem"]
+__all__ = ["RAGSystem", "format_result"]
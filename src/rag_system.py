@@ -7,26 +7,333 @@ This module implements a Retrieval-Augmented Generation system that:
 3. Enables question-answering using retrieved context
 """
 
+import functools
+import hashlib
+import json
+import logging
 import os
-from typing import List
+import pickle
+import shelve
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from operator import itemgetter
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
 from dotenv import load_dotenv
 
+import faiss
+import numpy as np
+import tiktoken
+
 from langchain_community.document_loaders import DirectoryLoader, TextLoader
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain_openai import OpenAIEmbeddings, ChatOpenAI
-from langchain_community.vectorstores import Chroma
-from langchain.chains import RetrievalQA
+from langchain.embeddings import CacheBackedEmbeddings
+from langchain.storage import LocalFileStore
+from langchain_core.embeddings import Embeddings
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.runnables import (
+    Runnable,
+    RunnableLambda,
+    RunnableParallel,
+    RunnablePassthrough,
+)
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain_community.vectorstores import FAISS
 from langchain.prompts import PromptTemplate
 from langchain.schema import Document
 
 
+_LOG = logging.getLogger(__name__)
+_SEP = "-" * 80
+
+DOCUMENT_GLOB = "**/*.txt"
+# Chunk sizes are measured in LLM tokens (roughly 1000 / 200 characters)
+CHUNK_SIZE = 250
+CHUNK_OVERLAP = 50
+# Upper bound on the retrieved context passed to the LLM
+MAX_CONTEXT_TOKENS = 3000
+MANIFEST_FILENAME = "manifest.json"
+
+LLM_MODEL = "gpt-3.5-turbo"
+EMBEDDING_MODEL = "text-embedding-ada-002"
+# OpenAI accepts at most 2048 inputs and 300k tokens per embeddings request;
+# the token cap leaves headroom for tokenizer differences
+EMBEDDING_BATCH_SIZE = 2048
+EMBEDDING_BATCH_MAX_TOKENS = 250_000
+# The OpenAI clients retry rate limited (429), server and connection errors
+# with exponential backoff, honouring the server's Retry-After hint
+MAX_API_RETRIES = 5
+QUERY_CACHE_SIZE = 4096
+QUERY_CACHE_TTL_SECONDS = 3600
+
+# Index layouts: exact scan, HNSW graph, and inverted file lists with
+# product-quantized vectors whose coarse quantizer is exact (ivf_pq) or an
+# HNSW graph (ivf_hnsw). "auto" picks one from the corpus size.
+INDEX_TYPES = ("auto", "flat", "hnsw", "ivf_pq", "ivf_hnsw")
+# Vector encodings supported by the HNSW index: full precision, 8-bit scalar
+# quantization (4x smaller) and product quantization (64x smaller at 1536 dims)
+QUANTIZATION_TYPES = ("fp32", "int8", "pq")
+# An HNSW search costs roughly a*log(N) + b*ef_search + c distance computations
+# and graph hops; below this many vectors a single exact scan is cheaper
+EXACT_SEARCH_MAX_VECTORS = 2000
+# Above this many vectors a flat HNSW graph no longer fits comfortably in memory
+IVF_MIN_VECTORS = 1_000_000
+IVF_MAX_LISTS = 4096
+IVF_NPROBE = 16
+PQ_SUBQUANTIZERS = 96
+PQ_BITS = 8
+MAX_TRAINING_VECTORS = 128_000
+MAX_IVF_TRAINING_VECTORS = 200_000
+
+ANSWER_CACHE_SIZE = 256
+ANSWER_CACHE_TTL_SECONDS = 3600
+
+QA_PROMPT = PromptTemplate(
+    template="""You are a helpful assistant that answers questions based on the provided context.
+Use the following pieces of context to answer the question at the end.
+If you don't know the answer based on the context, just say that you don't know, don't try to make up an answer.
+Always provide a clear and concise answer.
+
+Context:
+{context}
+
+Question: {question}
+
+Answer:""",
+    input_variables=["context", "question"]
+)
+
+
+def _embedding_batches(texts: List[str], token_counts: List[int]) -> List[List[str]]:
+    """
+    Group texts into consecutive batches that stay within OpenAI's per-request
+    limits on both the number of inputs and the total number of tokens.
+    """
+    batches = []
+    batch = []
+    batch_tokens = 0
+    
+    for text, n_tokens in zip(texts, token_counts):
+        if batch and (
+            len(batch) == EMBEDDING_BATCH_SIZE
+            or batch_tokens + n_tokens > EMBEDDING_BATCH_MAX_TOKENS
+        ):
+            batches.append(batch)
+            batch = []
+            batch_tokens = 0
+        batch.append(text)
+        batch_tokens += n_tokens
+    
+    if batch:
+        batches.append(batch)
+    
+    return batches
+
+
+def _format_docs(docs: List[Document]) -> str:
+    """Join retrieved documents into the context block of the prompt."""
+    return "\n\n".join(doc.page_content for doc in docs)
+
+
+def _check_pq_trainable(n: int, dimension: int):
+    """
+    Raise a ValueError if product quantization cannot be trained on n vectors
+    of the given dimension.
+    """
+    if dimension % PQ_SUBQUANTIZERS:
+        raise ValueError(
+            f"Embedding dimension {dimension} is not divisible by {PQ_SUBQUANTIZERS}"
+        )
+    if n < 2 ** PQ_BITS:
+        raise ValueError(
+            f"Product quantization needs at least {2 ** PQ_BITS} chunks to train, "
+            f"got {n}. Use a flat or unquantized HNSW index for small corpora."
+        )
+
+
+@functools.lru_cache(maxsize=None)
+def _encoding() -> tiktoken.Encoding:
+    """The tokenizer of the chat model, loaded once."""
+    return tiktoken.encoding_for_model(LLM_MODEL)
+
+
+def _token_length(text: str) -> int:
+    """Number of LLM tokens in text."""
+    return len(_encoding().encode(text))
+
+
+def _n_tokens(doc: Document) -> int:
+    """Token count of a chunk, as stored at split time."""
+    return doc.metadata.get("n_tokens") or _token_length(doc.page_content)
+
+
+def _fit_context_budget(
+    docs: List[Document], max_tokens: int = MAX_CONTEXT_TOKENS
+) -> List[Document]:
+    """
+    Keep the highest ranked documents whose combined size fits in
+    max_tokens, using the token counts stored at split time.
+    The top document is always kept.
+    """
+    kept = []
+    total_tokens = 0
+    
+    for doc in docs:
+        n_tokens = _n_tokens(doc)
+        if kept and total_tokens + n_tokens > max_tokens:
+            break
+        kept.append(doc)
+        total_tokens += n_tokens
+    
+    return kept
+
+
+def _content_hash(text: str) -> str:
+    """SHA-256 hex digest of a document's text."""
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+def _answer_cache_key(question: str, filter: Optional[Dict[str, Any]]) -> str:
+    """Key identifying a question and its metadata filter in the answer cache."""
+    key = json.dumps([question, filter], sort_keys=True, default=repr)
+    return hashlib.sha256(key.encode()).hexdigest()
+
+
+def format_result(result: dict) -> str:
+    """
+    Format a result returned by RAGSystem.ask() or RAGSystem.aask() for display.
+    
+    Args:
+        result: Dictionary with the question, answer and sources
+        
+    Returns:
+        Multi-line text with the question, answer and numbered sources
+    """
+    lines = [f"Question: {result['question']}", _SEP, f"Answer: {result['answer']}", ""]
+    
+    if result["sources"]:
+        lines.append("Sources:")
+        lines.extend(f"  {i}. {source}" for i, source in enumerate(result["sources"], 1))
+    
+    lines.append(_SEP)
+    
+    return "\n".join(lines)
+
+
+def _warn_if_faiss_unoptimized():
+    """
+    Warn when the CPU supports AVX2 but the loaded FAISS build does not use it.
+    
+    faiss-cpu wheels ship generic, AVX2 and AVX-512 variants and load the best
+    one the CPU supports; the generic build computes distances several times
+    slower.
+    """
+    cpu_features = faiss.supported_instruction_sets()
+    compile_options = faiss.get_compile_options()
+    
+    if "AVX2" in cpu_features and not any(
+        level in compile_options for level in ("AVX2", "AVX512")
+    ):
+        _LOG.warning(
+            "FAISS was loaded without AVX2 support although the CPU has it. "
+            "Reinstall faiss-cpu to get the SIMD-optimized distance kernels."
+        )
+
+
+class _LRUCache:
+    """
+    A small least-recently-used cache whose entries expire after a fixed time.
+    Safe to share between threads.
+    """
+    
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, key: str) -> Optional[Any]:
+        """Return the cached value for key, or None if missing or expired."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            
+            self._entries.move_to_end(key)
+            return value
+    
+    def set(self, key: str, value: Any):
+        """Store value under key, evicting the least recently used entry if full."""
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            if len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+
+class _QueryCachedEmbeddings(Embeddings):
+    """
+    Embeddings wrapper that keeps recent query embeddings in memory, so
+    repeated questions don't trigger another embeddings API call.
+    """
+    
+    def __init__(self, underlying: Embeddings):
+        self.underlying = underlying
+        self._cache = _LRUCache(QUERY_CACHE_SIZE, QUERY_CACHE_TTL_SECONDS)
+    
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.underlying.embed_documents(texts)
+    
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        return await self.underlying.aembed_documents(texts)
+    
+    def embed_query(self, text: str) -> List[float]:
+        key = hashlib.sha256(text.encode()).hexdigest()
+        embedding = self._cache.get(key)
+        if embedding is None:
+            embedding = self.underlying.embed_query(text)
+            self._cache.set(key, embedding)
+        return embedding
+    
+    async def aembed_query(self, text: str) -> List[float]:
+        key = hashlib.sha256(text.encode()).hexdigest()
+        embedding = self._cache.get(key)
+        if embedding is None:
+            embedding = await self.underlying.aembed_query(text)
+            self._cache.set(key, embedding)
+        return embedding
+
+
 class RAGSystem:
     """
     A Retrieval-Augmented Generation system that combines document retrieval
     with language model generation to answer questions based on a knowledge base.
     """
     
-    def __init__(self, data_dir: str = "data", persist_directory: str = "chroma_db"):
+    def __init__(
+        self,
+        data_dir: str = "data",
+        persist_directory: str = "faiss_index",
+        hnsw_m: int = 32,
+        ef_construction: int = 64,
+        k: int = 3,
+        max_context_tokens: int = MAX_CONTEXT_TOKENS,
+        ef_search: Optional[int] = None,
+        max_concurrent_requests: int = 8,
+        embedding_cache_dir: str = ".emb_cache",
+        quantization: str = "fp32",
+        index_type: str = "auto",
+        mmap_index: bool = True,
+        chunk_cache_path: Optional[str] = None,
+    ):
         """
         Initialize the RAG system.
         
@@ -35,6 +342,36 @@ class RAGSystem:
             persist_directory: Directory to persist the vector database. If the directory
                              already exists, the vector store will be loaded from it.
                              If it doesn't exist, it will be created during initialization.
+                             Loading unpickles it, so it must be writable only by you.
+            hnsw_m: Number of neighbors per node in the HNSW graph
+            ef_construction: Candidate list size used while building the HNSW graph
+            k: Number of chunks retrieved as context for each question
+            max_context_tokens: Cap on the size of the context passed to the LLM.
+                                The lowest ranked of the k chunks are dropped
+                                when they do not fit.
+            ef_search: Candidate list size used while searching the HNSW graph.
+                       Defaults to max(40, 4 * k).
+            max_concurrent_requests: Maximum number of OpenAI embedding requests in
+                                     flight at once. Keep this within your account's
+                                     rate limits.
+            embedding_cache_dir: Directory where document embeddings are cached, so
+                                 unchanged chunks are not re-embedded on rebuilds
+            quantization: How vectors are encoded in the HNSW index: "fp32" (exact),
+                          "int8" (scalar quantization) or "pq" (product
+                          quantization, needs at least 256 chunks to train).
+                          Corpora small enough for an exact scan are always
+                          stored uncompressed.
+            index_type: Index layout: "flat", "hnsw", "ivf_pq", "ivf_hnsw", or
+                        "auto" to use an exact scan below 2000 chunks, IVF with
+                        an HNSW coarse quantizer above 1M, and HNSW in between
+            mmap_index: Memory-map the persisted index when it is loaded without
+                        changes, so the OS pages vectors in on demand instead of
+                        reading them all into memory
+            chunk_cache_path: Path of the shelve database caching the chunks of
+                              each document, so unchanged files are not re-split.
+                              Defaults to "chunks" inside persist_directory.
+                              Like persist_directory it is pickle-based and must
+                              be writable only by you.
         """
         load_dotenv()
         
@@ -44,18 +381,57 @@ class RAGSystem:
                 "OpenAI API key not found. Please set OPENAI_API_KEY in your .env file"
             )
         
+        _warn_if_faiss_unoptimized()
+        
+        if quantization not in QUANTIZATION_TYPES:
+            raise ValueError(
+                f"Unknown quantization '{quantization}'. Expected one of {QUANTIZATION_TYPES}"
+            )
+        if index_type not in INDEX_TYPES:
+            raise ValueError(
+                f"Unknown index type '{index_type}'. Expected one of {INDEX_TYPES}"
+            )
+        
         self.data_dir = data_dir
         self.persist_directory = persist_directory
+        self.hnsw_m = hnsw_m
+        self.ef_construction = ef_construction
+        self.k = k
+        self.max_context_tokens = max_context_tokens
+        self.ef_search = ef_search if ef_search is not None else max(40, 4 * k)
+        self.max_concurrent_requests = max_concurrent_requests
+        self.quantization = quantization
+        self.index_type = index_type
+        self.mmap_index = mmap_index
+        self.chunk_cache_path = chunk_cache_path or os.path.join(persist_directory, "chunks")
         self.vectorstore = None
+        self.built_index_type: Optional[str] = None
         self.qa_chain = None
+        self._filtered_qa_chain = None
+        self._answer_cache = _LRUCache(ANSWER_CACHE_SIZE, ANSWER_CACHE_TTL_SECONDS)
+        self._metadata_index: Dict[Tuple[str, Any], Set[int]] = {}
         
-        # Initialize embeddings model
-        self.embeddings = OpenAIEmbeddings()
+        # Initialize embeddings model. Document embeddings are cached on disk
+        # and query embeddings in memory.
+        self.embeddings = _QueryCachedEmbeddings(
+            CacheBackedEmbeddings.from_bytes_store(
+                OpenAIEmbeddings(
+                    model=EMBEDDING_MODEL,
+                    chunk_size=EMBEDDING_BATCH_SIZE,
+                    max_retries=MAX_API_RETRIES
+                ),
+                LocalFileStore(embedding_cache_dir),
+                namespace=EMBEDDING_MODEL,
+                key_encoder="sha256"
+            )
+        )
         
         # Initialize LLM
         self.llm = ChatOpenAI(
-            model_name="gpt-3.5-turbo",
-            temperature=0.0
+            model_name=LLM_MODEL,
+            temperature=0.0,
+            streaming=True,
+            max_retries=MAX_API_RETRIES
         )
     
     def load_documents(self) -> List[Document]:
@@ -65,16 +441,22 @@ class RAGSystem:
         Returns:
             List of loaded Document objects
         """
-        print(f"Loading documents from {self.data_dir}...")
+        _LOG.info("Loading documents from %s...", self.data_dir)
         
         loader = DirectoryLoader(
             self.data_dir,
-            glob="**/*.txt",
-            loader_cls=TextLoader
+            glob=DOCUMENT_GLOB,
+            loader_cls=TextLoader,
+            use_multithreading=True,  # Overlap file I/O across documents
+            max_concurrency=os.cpu_count() or 8
         )
         
-        documents = loader.load()
-        print(f"Loaded {len(documents)} documents")
+        # Threads return documents in completion order; sort them so chunk
+        # order and FAISS ids are the same on every run
+        documents = sorted(loader.load(), key=lambda doc: doc.metadata["source"])
+        for doc in documents:
+            doc.metadata["hash"] = _content_hash(doc.page_content)
+        _LOG.info("Loaded %d documents", len(documents))
         
         return documents
     
@@ -82,22 +464,47 @@ class RAGSystem:
         """
         Split documents into smaller chunks for better retrieval.
         
+        Chunks are cached by document content and splitter settings, so only
+        new or changed documents are split again.
+        
         Args:
             documents: List of Document objects to split
             
         Returns:
             List of Document chunks
         """
-        print("Splitting documents into chunks...")
+        _LOG.info("Splitting documents into chunks...")
         
+        # Measure chunks in tokens with tiktoken's native encoder, so chunk
+        # sizes match what the model actually sees
         text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=1000,
-            chunk_overlap=200,
-            length_function=len
+            chunk_size=CHUNK_SIZE,
+            chunk_overlap=CHUNK_OVERLAP,
+            length_function=_token_length
         )
         
-        chunks = text_splitter.split_documents(documents)
-        print(f"Created {len(chunks)} document chunks")
+        chunks = []
+        os.makedirs(os.path.dirname(self.chunk_cache_path) or ".", exist_ok=True)
+        with shelve.open(self.chunk_cache_path) as cache:
+            for doc in documents:
+                # One entry per source, so an edited file replaces its old chunks
+                source = doc.metadata.get("source", "")
+                fingerprint = ":".join([
+                    LLM_MODEL,
+                    str(CHUNK_SIZE),
+                    str(CHUNK_OVERLAP),
+                    doc.metadata.get("hash") or _content_hash(doc.page_content),
+                ])
+                
+                entry = cache.get(source)
+                if entry is None or entry[0] != fingerprint:
+                    doc_chunks = text_splitter.split_documents([doc])
+                    for chunk in doc_chunks:
+                        chunk.metadata["n_tokens"] = _token_length(chunk.page_content)
+                    entry = cache[source] = (fingerprint, doc_chunks)
+                chunks.extend(entry[1])
+        
+        _LOG.info("Created %d document chunks", len(chunks))
         
         return chunks
     
@@ -108,28 +515,326 @@ class RAGSystem:
         Args:
             documents: List of Document objects to store
         """
-        print("Creating vector store...")
+        if not documents:
+            raise ValueError(f"No documents to index. Add .txt files to {self.data_dir}.")
+        
+        _LOG.info("Creating vector store...")
+        
+        texts = [doc.page_content for doc in documents]
+        metadatas = [doc.metadata for doc in documents]
+        embeddings = self._embed_all(texts, [_n_tokens(doc) for doc in documents])
+        
+        self.built_index_type = self._resolve_index_type(len(embeddings))
+        self.vectorstore = FAISS(
+            embedding_function=self.embeddings,
+            index=self._build_index(
+                np.array(embeddings, dtype=np.float32), self.built_index_type
+            ),
+            docstore=InMemoryDocstore(),
+            index_to_docstore_id={}
+        )
+        self.vectorstore.add_embeddings(zip(texts, embeddings), metadatas=metadatas)
+        self._build_metadata_index()
+        self._save_vectorstore()
+        
+        _LOG.info("Vector store created and persisted to %s", self.persist_directory)
+    
+    def _save_vectorstore(self):
+        """
+        Persist the vector store together with a manifest describing how it
+        was built and which source files it contains, and drop cached chunks
+        of source files that no longer exist.
+        """
+        self.vectorstore.save_local(self.persist_directory)
+        
+        sources = self._source_hashes()
+        manifest = {
+            "config": self._index_config(),
+            "index_type": self.built_index_type,
+            "dim": self.vectorstore.index.d,
+            "sources": sources,
+        }
+        with open(os.path.join(self.persist_directory, MANIFEST_FILENAME), "w") as f:
+            json.dump(manifest, f, indent=2)
+        
+        with shelve.open(self.chunk_cache_path) as cache:
+            for source in set(cache) - set(sources):
+                del cache[source]
+    
+    def _read_manifest(self) -> Optional[dict]:
+        """
+        Read the manifest of the persisted vector store.
+        
+        Returns:
+            The manifest, or None if the vector store has none
+        """
+        manifest_path = os.path.join(self.persist_directory, MANIFEST_FILENAME)
+        if not os.path.exists(manifest_path):
+            return None
+        
+        with open(manifest_path, "r") as f:
+            return json.load(f)
+    
+    def _index_config(self) -> dict:
+        """
+        Settings that change the stored vectors. A persisted vector store built
+        with different settings has to be rebuilt.
+        """
+        return {
+            "model": EMBEDDING_MODEL,
+            "chunk_size": CHUNK_SIZE,
+            "chunk_overlap": CHUNK_OVERLAP,
+            "quantization": self.quantization,
+            "index_type": self.index_type,
+            "hnsw_m": self.hnsw_m,
+            "ef_construction": self.ef_construction,
+        }
+    
+    def _source_hashes(self) -> Dict[str, str]:
+        """
+        Hash the contents of every source file in the data directory.
         
-        self.vectorstore = Chroma.from_documents(
-            documents=documents,
-            embedding=self.embeddings,
-            persist_directory=self.persist_directory
+        Returns:
+            Mapping of source path to SHA-256 hex digest
+        """
+        return {
+            str(path): hashlib.sha256(path.read_bytes()).hexdigest()
+            for path in sorted(Path(self.data_dir).glob(DOCUMENT_GLOB))
+        }
+    
+    def _update_vectorstore(
+        self, indexed_sources: Dict[str, str], current_sources: Dict[str, str]
+    ) -> bool:
+        """
+        Bring a loaded vector store up to date with the data directory by
+        re-indexing only the source files that were added, changed or removed.
+        
+        Args:
+            indexed_sources: Source hashes recorded in the manifest
+            current_sources: Source hashes of the data directory
+            
+        Returns:
+            False if stale chunks could not be deleted or the index type no
+            longer fits the corpus size, and a rebuild is needed
+        """
+        new_sources = [
+            source for source, digest in current_sources.items()
+            if indexed_sources.get(source) != digest
+        ]
+        stale_sources = {
+            source for source, digest in indexed_sources.items()
+            if current_sources.get(source) != digest
+        }
+        
+        if not new_sources and not stale_sources:
+            return True
+        
+        _LOG.info(
+            "Updating vector store: %d new or changed, %d removed source(s)...",
+            len(new_sources),
+            len(stale_sources - set(new_sources))
         )
         
-        print(f"Vector store created and persisted to {self.persist_directory}")
+        if stale_sources:
+            docstore = self.vectorstore.docstore
+            stale_ids = [
+                doc_id for doc_id in self.vectorstore.index_to_docstore_id.values()
+                if docstore.search(doc_id).metadata.get("source") in stale_sources
+            ]
+            if stale_ids:
+                # FAISS.delete renumbers the remaining vectors 0..n-1, which only
+                # matches what the index does for flat indexes. HNSW cannot
+                # remove vectors and IVF keeps the original ids, so rebuild.
+                if not isinstance(self.vectorstore.index, faiss.IndexFlat):
+                    return False
+                self.vectorstore.delete(stale_ids)
+        
+        if new_sources:
+            documents = [doc for source in new_sources for doc in TextLoader(source).load()]
+            chunks = self.split_documents(documents)
+            texts = [chunk.page_content for chunk in chunks]
+            embeddings = self._embed_all(texts, [_n_tokens(chunk) for chunk in chunks])
+            
+            # Added vectors are encoded with the already trained quantizer
+            self.vectorstore.add_embeddings(
+                zip(texts, embeddings),
+                metadatas=[chunk.metadata for chunk in chunks]
+            )
+        
+        # An "auto" index that grew or shrank past a size threshold no longer
+        # has the type its size calls for
+        index_type = self._resolve_index_type(self.vectorstore.index.ntotal)
+        if index_type != self.built_index_type:
+            _LOG.info(
+                "Index size calls for a %s index instead of %s, rebuilding...",
+                index_type,
+                self.built_index_type
+            )
+            return False
+        
+        self._build_metadata_index()
+        self._save_vectorstore()
+        _LOG.info("Vector store updated")
+        
+        return True
     
-    def load_vectorstore(self):
+    def _embed_all(self, texts: List[str], token_counts: List[int]) -> List[List[float]]:
+        """
+        Embed texts in batches, sending up to max_concurrent_requests batches at once.
+        
+        Batches run on a thread pool over the synchronous client rather than an
+        event loop, so this also works when called from code that already runs
+        one (Jupyter, async applications).
+        
+        Args:
+            texts: Texts to embed
+            token_counts: Token count of each text, used to size the batches
+            
+        Returns:
+            One embedding per text, in input order
+        """
+        with ThreadPoolExecutor(max_workers=self.max_concurrent_requests) as pool:
+            results = list(pool.map(
+                self.embeddings.embed_documents, _embedding_batches(texts, token_counts)
+            ))
+        
+        return [embedding for batch in results for embedding in batch]
+    
+    def _resolve_index_type(self, n: int) -> str:
+        """
+        Resolve the configured index type for a corpus of n vectors. With
+        index_type "auto" the type follows the number of vectors: an exact
+        flat index for small corpora, IVF with an HNSW coarse quantizer for
+        very large ones, and HNSW with the configured quantization otherwise.
+        
+        Args:
+            n: Number of vectors in the index
+            
+        Returns:
+            One of the concrete index types
+        """
+        if self.index_type != "auto":
+            return self.index_type
+        if n < EXACT_SEARCH_MAX_VECTORS:
+            return "flat"
+        if n > IVF_MIN_VECTORS:
+            return "ivf_hnsw"
+        return "hnsw"
+    
+    def _build_index(self, vectors: np.ndarray, index_type: str) -> faiss.Index:
+        """
+        Build an empty index of the given type.
+        
+        Args:
+            vectors: Embeddings that will be indexed, used to train quantizers
+            index_type: Concrete index type from _resolve_index_type
+            
+        Returns:
+            An empty, trained FAISS index
+        """
+        n, dimension = vectors.shape
+        
+        if index_type == "flat":
+            return faiss.IndexFlatL2(dimension)
+        
+        if index_type in ("ivf_pq", "ivf_hnsw"):
+            return self._build_ivf_index(vectors, use_hnsw_quantizer=index_type == "ivf_hnsw")
+        
+        if self.quantization == "int8":
+            index = faiss.IndexHNSWSQ(dimension, faiss.ScalarQuantizer.QT_8bit, self.hnsw_m)
+        elif self.quantization == "pq":
+            _check_pq_trainable(n, dimension)
+            index = faiss.IndexHNSWPQ(dimension, PQ_SUBQUANTIZERS, self.hnsw_m, PQ_BITS)
+        else:
+            index = faiss.IndexHNSWFlat(dimension, self.hnsw_m)
+        
+        index.hnsw.efConstruction = self.ef_construction
+        if not index.is_trained:
+            index.train(vectors[:MAX_TRAINING_VECTORS])
+        
+        return index
+    
+    def _build_ivf_index(self, vectors: np.ndarray, use_hnsw_quantizer: bool) -> faiss.Index:
+        """
+        Build an empty IVF-PQ index, trained on a random sample of the vectors.
+        
+        Args:
+            vectors: Embeddings that will be indexed, used for training
+            use_hnsw_quantizer: Assign vectors to lists with an HNSW graph over
+                                the list centroids instead of an exact scan
+            
+        Returns:
+            An empty, trained FAISS IVF-PQ index
+        """
+        n, dimension = vectors.shape
+        _check_pq_trainable(n, dimension)
+        
+        # k-means wants roughly 39 training points per list
+        nlist = min(IVF_MAX_LISTS, max(1, n // 39))
+        
+        if use_hnsw_quantizer:
+            quantizer = faiss.IndexHNSWFlat(dimension, self.hnsw_m)
+            quantizer.hnsw.efConstruction = self.ef_construction
+        else:
+            quantizer = faiss.IndexFlatL2(dimension)
+        
+        index = faiss.IndexIVFPQ(quantizer, dimension, nlist, PQ_SUBQUANTIZERS, PQ_BITS)
+        index.nprobe = IVF_NPROBE
+        
+        sample_size = min(n, MAX_IVF_TRAINING_VECTORS)
+        sample = vectors[np.random.default_rng(0).choice(n, sample_size, replace=False)]
+        index.train(sample)
+        
+        return index
+    
+    def _build_metadata_index(self):
+        """
+        Map every (metadata key, value) pair to the FAISS ids of the chunks
+        carrying it, so filtered searches can select eligible ids without
+        scanning the docstore.
+        """
+        docstore = self.vectorstore.docstore
+        self._metadata_index = {}
+        
+        for index_id, doc_id in self.vectorstore.index_to_docstore_id.items():
+            for key, value in docstore.search(doc_id).metadata.items():
+                try:
+                    self._metadata_index.setdefault((key, value), set()).add(index_id)
+                except TypeError:
+                    # Unhashable values (lists, dicts) cannot be filtered on
+                    continue
+    
+    def load_vectorstore(self, mmap: bool = False):
         """
         Load an existing vector store from disk.
+        
+        Args:
+            mmap: Memory-map the index read-only instead of reading it into
+                  memory. FAISS maps the inverted lists of IVF indexes; other
+                  index types are read normally. A memory-mapped index cannot
+                  be modified.
         """
-        print(f"Loading vector store from {self.persist_directory}...")
+        _LOG.info("Loading vector store from %s...", self.persist_directory)
         
-        self.vectorstore = Chroma(
-            persist_directory=self.persist_directory,
-            embedding_function=self.embeddings
+        io_flags = faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY if mmap else 0
+        index = faiss.read_index(
+            os.path.join(self.persist_directory, "index.faiss"), io_flags
         )
         
-        print("Vector store loaded successfully")
+        # The docstore is pickled by save_local(), and unpickling runs arbitrary
+        # code: persist_directory must be writable only by the user (SECURITY.md)
+        with open(os.path.join(self.persist_directory, "index.pkl"), "rb") as f:
+            docstore, index_to_docstore_id = pickle.load(f)
+        
+        self.vectorstore = FAISS(
+            embedding_function=self.embeddings,
+            index=index,
+            docstore=docstore,
+            index_to_docstore_id=index_to_docstore_id
+        )
+        self._build_metadata_index()
+        
+        _LOG.info("Vector store loaded successfully")
     
     def setup_qa_chain(self):
         """
@@ -138,36 +843,72 @@ class RAGSystem:
         if not self.vectorstore:
             raise ValueError("Vector store not initialized. Call create_vectorstore() first.")
         
-        # Create a custom prompt template
-        prompt_template = """You are a helpful assistant that answers questions based on the provided context.
-Use the following pieces of context to answer the question at the end.
-If you don't know the answer based on the context, just say that you don't know, don't try to make up an answer.
-Always provide a clear and concise answer.
-
-Context:
-{context}
-
-Question: {question}
-
-Answer:"""
+        index = self.vectorstore.index
+        if hasattr(index, "hnsw"):
+            index.hnsw.efSearch = self.ef_search
+        if hasattr(index, "nprobe"):
+            index.nprobe = IVF_NPROBE
+            quantizer = faiss.downcast_index(index.quantizer)
+            if hasattr(quantizer, "hnsw"):
+                quantizer.hnsw.efSearch = self.ef_search
         
-        PROMPT = PromptTemplate(
-            template=prompt_template,
-            input_variables=["context", "question"]
+        # Create the retrieval QA chain
+        self.qa_chain = self._build_qa_chain(
+            self.vectorstore.as_retriever(
+                search_kwargs={"k": self.k}  # Retrieve the k most relevant chunks
+            )
         )
         
-        # Create the retrieval QA chain
-        self.qa_chain = RetrievalQA.from_chain_type(
-            llm=self.llm,
-            chain_type="stuff",
-            retriever=self.vectorstore.as_retriever(
-                search_kwargs={"k": 3}  # Retrieve top 3 most relevant chunks
+        # Filtered questions take {"question", "filter"} and go through the
+        # index-level pre-filter of similarity_search
+        self._filtered_qa_chain = self._build_qa_chain(
+            RunnableLambda(
+                lambda inputs: self.similarity_search(
+                    inputs["question"], filter=inputs["filter"]
+                )
             ),
-            return_source_documents=True,
-            chain_type_kwargs={"prompt": PROMPT}
+            question=itemgetter("question")
+        )
+        
+        # Cached answers may be stale once the chain sees a different index
+        self._answer_cache = _LRUCache(ANSWER_CACHE_SIZE, ANSWER_CACHE_TTL_SECONDS)
+        
+        _LOG.info("QA chain set up successfully")
+    
+    def _build_qa_chain(
+        self, retriever: Runnable, question: Optional[Runnable] = None
+    ) -> Runnable:
+        """
+        Build a retrieval QA chain around the given retriever.
+        
+        The chain returns a dictionary with the retrieved documents under
+        "context" and the generated text under "answer".
+        
+        Args:
+            retriever: Runnable that maps the chain input to context documents
+            question: Runnable that extracts the question from the chain input.
+                      Defaults to passing the input through, for chains that
+                      take the question string.
+            
+        Returns:
+            The QA chain
+        """
+        answer_chain = (
+            {
+                "context": itemgetter("context") | RunnableLambda(_format_docs),
+                "question": itemgetter("question"),
+            }
+            | QA_PROMPT
+            | self.llm
+            | StrOutputParser()
         )
         
-        print("QA chain set up successfully")
+        return RunnableParallel(
+            context=retriever | RunnableLambda(
+                functools.partial(_fit_context_budget, max_tokens=self.max_context_tokens)
+            ),
+            question=question or RunnablePassthrough()
+        ).assign(answer=answer_chain)
     
     def initialize(self, force_reload: bool = False):
         """
@@ -176,25 +917,47 @@ Answer:"""
         Args:
             force_reload: If True, reload documents even if vector store exists
         """
-        # Check if vector store already exists
-        if os.path.exists(self.persist_directory) and not force_reload:
-            print("Existing vector store found. Loading...")
-            self.load_vectorstore()
+        # Reuse the existing vector store if it was built with the current settings
+        manifest = None if force_reload else self._read_manifest()
+        
+        if manifest is not None and manifest["config"] == self._index_config():
+            _LOG.info("Existing vector store found. Loading...")
+            current_sources = self._source_hashes()
+            unchanged = current_sources == manifest["sources"]
+            
+            # Only an index that won't be updated can be memory-mapped read-only
+            self.load_vectorstore(mmap=self.mmap_index and unchanged)
+            self.built_index_type = manifest.get("index_type")
+            up_to_date = unchanged or self._update_vectorstore(
+                manifest["sources"], current_sources
+            )
         else:
-            print("Creating new vector store...")
+            up_to_date = False
+        
+        if not up_to_date:
+            _LOG.info("Creating new vector store...")
             documents = self.load_documents()
             chunks = self.split_documents(documents)
             self.create_vectorstore(chunks)
         
         self.setup_qa_chain()
-        print("\nRAG system initialized and ready to answer questions!\n")
+        _LOG.info("RAG system initialized and ready to answer questions")
     
-    def ask(self, question: str) -> dict:
+    def ask(
+        self,
+        question: str,
+        filter: Optional[Dict[str, Any]] = None,
+        on_token: Optional[Callable[[str], None]] = None,
+    ) -> dict:
         """
         Ask a question and get an answer from the RAG system.
         
         Args:
             question: The question to ask
+            filter: Optional metadata filter, e.g. {"source": "data/rag_overview.txt"}.
+                    Only matching chunks are used as context (see similarity_search).
+            on_token: Optional callback receiving the answer text as it is
+                      generated, e.g. to print it while streaming
             
         Returns:
             Dictionary containing the answer and source documents
@@ -202,37 +965,139 @@ Answer:"""
         if not self.qa_chain:
             raise ValueError("QA chain not initialized. Call initialize() first.")
         
-        print(f"\nQuestion: {question}")
-        print("-" * 80)
+        cache_key = _answer_cache_key(question, filter)
+        cached = self._cached_answer(cache_key)
         
-        result = self.qa_chain.invoke({"query": question})
+        if cached is not None:
+            answer, sources = cached
+            if on_token:
+                on_token(answer)
+        else:
+            qa_chain, chain_input = self._qa_chain_for(question, filter)
+            
+            # Stream the answer so the first tokens reach on_token as soon as they arrive
+            answer_parts = []
+            source_docs = []
+            for chunk in qa_chain.stream(chain_input):
+                if "context" in chunk:
+                    source_docs = chunk["context"]
+                if "answer" in chunk:
+                    if on_token:
+                        on_token(chunk["answer"])
+                    answer_parts.append(chunk["answer"])
+            
+            answer = "".join(answer_parts)
+            sources = [doc.metadata.get("source", "Unknown") for doc in source_docs]
+            self._cache_answer(cache_key, answer, sources)
         
-        answer = result["result"]
-        source_docs = result["source_documents"]
+        return {
+            "question": question,
+            "answer": answer,
+            "sources": sources
+        }
+    
+    async def aask(self, question: str, filter: Optional[Dict[str, Any]] = None) -> dict:
+        """
+        Ask a question, awaiting the answer asynchronously so several questions
+        can be in flight at once.
         
-        print(f"Answer: {answer}\n")
+        The OpenAI async clients keep pooled connections tied to the event loop
+        that first used them, so call aask() from one long-lived loop rather
+        than from separate asyncio.run() calls.
         
-        if source_docs:
-            print("Sources:")
-            for i, doc in enumerate(source_docs, 1):
-                source = doc.metadata.get("source", "Unknown")
-                print(f"  {i}. {source}")
+        Args:
+            question: The question to ask
+            filter: Optional metadata filter, as for ask()
+            
+        Returns:
+            Dictionary containing the answer and source documents
+        """
+        if not self.qa_chain:
+            raise ValueError("QA chain not initialized. Call initialize() first.")
         
-        print("-" * 80)
+        cache_key = _answer_cache_key(question, filter)
+        cached = self._cached_answer(cache_key)
+        
+        if cached is not None:
+            answer, sources = cached
+        else:
+            qa_chain, chain_input = self._qa_chain_for(question, filter)
+            result = await qa_chain.ainvoke(chain_input)
+            
+            answer = result["answer"]
+            sources = [doc.metadata.get("source", "Unknown") for doc in result["context"]]
+            self._cache_answer(cache_key, answer, sources)
         
         return {
             "question": question,
             "answer": answer,
-            "sources": [doc.metadata.get("source", "Unknown") for doc in source_docs]
+            "sources": sources
         }
     
-    def similarity_search(self, query: str, k: int = 3) -> List[Document]:
+    def ask_many(self, questions: List[str], max_concurrency: int = 5) -> List[dict]:
+        """
+        Ask several questions concurrently.
+        
+        Questions are answered on a thread pool through the synchronous
+        clients, so no event loop is created and this can be called from code
+        that already runs one. Async code can await aask() directly instead.
+        
+        Args:
+            questions: The questions to ask
+            max_concurrency: Maximum number of questions answered at once
+            
+        Returns:
+            One result dictionary per question, in the same order as questions
+        """
+        with ThreadPoolExecutor(max_workers=max_concurrency) as pool:
+            return list(pool.map(self.ask, questions))
+    
+    def _qa_chain_for(
+        self, question: str, filter: Optional[Dict[str, Any]]
+    ) -> Tuple[Runnable, Any]:
+        """
+        Return the QA chain to use for a question with the given metadata
+        filter, together with the input to run it on.
+        """
+        if not filter:
+            return self.qa_chain, question
+        
+        return self._filtered_qa_chain, {"question": question, "filter": filter}
+    
+    def _cached_answer(self, cache_key: str) -> Optional[tuple]:
+        """
+        Return the cached (answer, sources) pair for a question, if any.
+        
+        With temperature 0 the answer is deterministic, so it can be reused.
+        """
+        if self.llm.temperature != 0:
+            return None
+        return self._answer_cache.get(cache_key)
+    
+    def _cache_answer(self, cache_key: str, answer: str, sources: List[str]):
+        """
+        Cache the answer to a question when answers are deterministic.
+        """
+        if self.llm.temperature == 0:
+            self._answer_cache.set(cache_key, (answer, sources))
+    
+    def similarity_search(
+        self, query: str, k: Optional[int] = None, filter: Optional[Dict[str, Any]] = None
+    ) -> List[Document]:
         """
         Perform similarity search to find relevant documents.
         
+        Filters are applied inside the index: the ids of chunks whose metadata
+        matches are looked up in an in-memory metadata index and passed to FAISS
+        as an ID selector, so the search only scores eligible vectors instead of
+        filtering the top results afterwards.
+        
         Args:
             query: The search query
-            k: Number of documents to return
+            k: Number of documents to return. Defaults to the system's k.
+            filter: Optional metadata filter; a chunk matches when every key
+                    equals the given value, e.g. {"source": "data/rag_overview.txt"},
+                    or any of the values of a list, e.g. {"source": ["a.txt", "b.txt"]}
             
         Returns:
             List of relevant Document objects
@@ -240,20 +1105,79 @@ Answer:"""
         if not self.vectorstore:
             raise ValueError("Vector store not initialized. Call initialize() first.")
         
-        return self.vectorstore.similarity_search(query, k=k)
+        k = k or self.k
+        
+        if not filter:
+            return self.vectorstore.similarity_search(query, k=k)
+        
+        docstore = self.vectorstore.docstore
+        index_to_docstore_id = self.vectorstore.index_to_docstore_id
+        
+        matching_ids = set.intersection(*(
+            self._ids_matching(key, value) for key, value in filter.items()
+        ))
+        if not matching_ids:
+            return []
+        
+        selector = faiss.IDSelectorBatch(np.array(sorted(matching_ids), dtype=np.int64))
+        query_vector = np.array([self.embeddings.embed_query(query)], dtype=np.float32)
+        _, indices = self.vectorstore.index.search(
+            query_vector, k, params=self._search_parameters(selector)
+        )
+        
+        return [
+            docstore.search(index_to_docstore_id[index_id])
+            for index_id in indices[0]
+            if index_id != -1
+        ]
+    
+    def _ids_matching(self, key: str, value: Any) -> Set[int]:
+        """
+        FAISS ids of the chunks whose metadata key equals value, or any of the
+        values if value is a list.
+        """
+        values = value if isinstance(value, list) else [value]
+        try:
+            return set().union(*(self._metadata_index.get((key, v), set()) for v in values))
+        except TypeError:
+            raise ValueError(
+                f"Cannot filter '{key}' on {value!r}: values must be hashable"
+            ) from None
+    
+    def _search_parameters(self, selector: faiss.IDSelector) -> faiss.SearchParameters:
+        """
+        Build search parameters restricted to the selected ids, using the
+        parameter type the index expects. IVF indexes reject plain
+        SearchParameters, and HNSW indexes take ef_search from them.
+        
+        Args:
+            selector: Ids eligible to be returned
+            
+        Returns:
+            Search parameters for the vector store's index
+        """
+        index = self.vectorstore.index
+        
+        if hasattr(index, "nprobe"):
+            return faiss.SearchParametersIVF(sel=selector, nprobe=IVF_NPROBE)
+        if hasattr(index, "hnsw"):
+            return faiss.SearchParametersHNSW(sel=selector, efSearch=self.ef_search)
+        return faiss.SearchParameters(sel=selector)
 
 
 def main():
     """
     Main function to demonstrate the RAG system.
     """
+    logging.basicConfig(level=logging.WARNING, format="%(message)s")
+    
     print("=" * 80)
     print("RAG System - Retrieval-Augmented Generation with LangChain")
     print("=" * 80)
     print()
     
     # Initialize the RAG system
-    rag = RAGSystem(data_dir="data", persist_directory="chroma_db")
+    rag = RAGSystem(data_dir="data", persist_directory="faiss_index")
     rag.initialize()
     
     # Example questions
@@ -264,9 +1188,9 @@ def main():
         "What is LangChain and what are its key components?",
     ]
     
-    # Ask questions
-    for question in questions:
-        rag.ask(question)
+    # Ask the example questions concurrently, then print them in order
+    for result in rag.ask_many(questions):
+        print(format_result(result))
         print()
     
     # Interactive mode
@@ -286,7 +1210,16 @@ def main():
             continue
         
         try:
-            rag.ask(question)
+            print(_SEP)
+            print("Answer: ", end="", flush=True)
+            result = rag.ask(question, on_token=lambda token: print(token, end="", flush=True))
+            print("\n")
+            
+            if result["sources"]:
+                print("Sources:")
+                for i, source in enumerate(result["sources"], 1):
+                    print(f"  {i}. {source}")
+            print(_SEP)
         except Exception as e:
             print(f"Error: {e}")
         